@@ -24,8 +24,8 @@ o.load(noise_buffer)
 # Now the input buffer is empty and the output buffer is filled/ready to send
 assert(i.bufstate == config.bufstate.empty and i2.bufstate == config.bufstate.empty)
 assert(o.bufstate == config.bufstate.ready_to_push)
-assert(i.buffer != noise_buffer and i2.buffer != noise_buffer)
-assert(o.buffer == noise_buffer)
+assert(not i.buffer.equals_value(noise_buffer) and not i2.buffer.equals_value(noise_buffer))
+assert(o.buffer.equals_value(noise_buffer))
 
 # Push data from the output to everything that's connected
 o.flush()
@@ -35,13 +35,13 @@ assert(o.bufstate == config.bufstate.empty)
 assert(o.buffer.empty())
 
 assert(i.bufstate == config.bufstate.filled and i2.bufstate == config.bufstate.filled)
-assert(i.buffer == noise_buffer and i2.buffer == noise_buffer)
+assert(i.buffer.equals_value(noise_buffer) and i2.buffer.equals_value(noise_buffer))
 assert(i.buffer.array is i2.buffer.array)
 
 # To disentangle i and i2, one must run prepare_to_modify
 i.buffer.prepare_to_modify()
 
-assert(i.buffer == noise_buffer and i2.buffer == noise_buffer)
+assert(i.buffer.equals_value(noise_buffer) and i2.buffer.equals_value(noise_buffer))
 assert(i.buffer.array is not i2.buffer.array)
 
 # Or just read it
@@ -0,0 +1,59 @@
+"""
+bufferpool module - Free-list of sample arrays which are reused across ticks
+
+Classes:
+    * BufferPool(object) - Free-list of np.ndarrays keyed on (shape, dtype)
+
+Variables:
+    * pool (BufferPool): The pool shared by all of Plappy
+"""
+import numpy as np
+
+
+class BufferPool(object):
+    """Free-list of np.ndarrays keyed on (shape, dtype). Arrays which are no longer referenced by any
+    SampleBuffer are released to the pool and handed out again instead of allocating a new array.
+
+    Ticking is single-threaded, and list.append/list.pop are atomic under the GIL, so no lock is taken.
+
+        max_free (int): Maximum number of arrays kept around for each (shape, dtype)
+    """
+
+    def __init__(self, max_free: int = 64):
+        """Initialize with an empty free-list"""
+        self.max_free = max_free
+        self._free = {}
+
+    def __repr__(self) -> str:
+        """Show the number of free arrays for each (shape, dtype)"""
+        free = ", ".join(f"{shape}/{dtype}: {len(arrays)}" for (shape, dtype), arrays in self._free.items())
+        return f"{type(self).__name__}(max_free={self.max_free}, free={{{free}}})"
+
+    def acquire(self, shape: int or tuple, dtype) -> np.ndarray:
+        """Return an uninitialized array, reusing a released one if possible"""
+        if isinstance(shape, int):
+            shape = (shape,)
+        try:
+            return self._free[(shape, np.dtype(dtype))].pop()
+        except (KeyError, IndexError):
+            return np.empty(shape, dtype=dtype)
+
+    def release(self, array: np.ndarray or None) -> 'BufferPool':
+        """Hand an array back to the pool. The caller must not use it afterwards.
+
+        Views, read-only and non-contiguous arrays are ignored, since something else owns their memory."""
+        if array is None or array.base is not None or not array.flags.writeable or not array.flags.c_contiguous:
+            return self
+
+        free = self._free.setdefault((array.shape, array.dtype), [])
+        if len(free) < self.max_free:
+            free.append(array)
+        return self
+
+    def clear(self) -> 'BufferPool':
+        """Drop all free arrays"""
+        self._free.clear()
+        return self
+
+
+pool = BufferPool()
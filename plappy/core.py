@@ -1,7 +1,22 @@
 class Connectable(object):
+    # Subclasses which don't declare __slots__ (like the Devices) get a __dict__ as usual
+    __slots__ = ('label',)
+
+    # Whether the class provides connector() and onconnect(), looked up once per class in __init_subclass__
+    _has_connector = False
+    _has_onconnect = False
+
+    # Class name used by __repr__, so it doesn't have to be looked up through type(self) on every call
+    _type_name = 'Connectable'
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._type_name = cls.__name__
+        cls._has_connector = hasattr(cls, 'connector')
+        cls._has_onconnect = hasattr(cls, 'onconnect')
+
     def __init__(self, label: str, *args, **kwargs):
         self.label = label
-        self.connections = set()
 
     def __str__(self) -> str:
         """Same as __repr__"""
@@ -33,24 +48,24 @@ class Connectable(object):
 
     def connect(self, other: 'Connectable', **kwargs):
         """Subclasses should call super() last"""
-        if other.has_connector():
+        if other._has_connector:
             other_connector = other.connector(**kwargs)
         else:
             other_connector = other
 
-        if self.has_connector():
+        if self._has_connector:
             self_connector = self.connector(**kwargs)
             self_connector.connect(other_connector, **kwargs)
         else:
             self_connector = self
 
-        if other.has_onconnect():
+        if other._has_onconnect:
             other_connector.onconnect(self_connector, **kwargs)
 
         return other
 
     def disconnect(self):
-        if self.has_connector():
+        if self._has_connector:
             ~(self.connector())
         return self
 
@@ -64,7 +79,12 @@ class Connectable(object):
         return False
 
     def has_connector(self):
-        return hasattr(self, 'connector')
+        return self._has_connector
 
     def has_onconnect(self):
-        return hasattr(self, 'onconnect')
+        return self._has_onconnect
+
+    def graph_changed(self) -> None:
+        """Called after a change to the device graph which involves self. Subclasses pass it on to the
+        Devices which contain them, so that only the affected schedules are recompiled."""
+        pass
@@ -4,15 +4,19 @@ devices module - Base-level Device
 Classes:
     * Device - a generic Device
 """
-import collections
+import sys
+from collections.abc import Iterable
 
 from plappy.core import Connectable
-from plappy.io import IO
+from plappy.io import IO, Output
 from plappy.plappyconfig import config
 from plappy.util import unique_key
 
 DevicePatch = dict
 
+_FILLED = config.bufstate.filled
+_READY = config.bufstate.ready_to_push
+
 class Device(Connectable):
     """A generic Device.
 
@@ -26,16 +30,53 @@ class Device(Connectable):
         super().__init__(label)
         self.ios = {}
         self.subdevices = {}
+        self._repr_cache = None
+
+        # Plain lists for the hot loops in tick() and process(). The dicts are only used for label lookups.
+        # IOs are partitioned by role so tick() doesn't have to walk and branch over every IO twice.
+        self._input_ios = []
+        self._output_ios = []
+        self._subdevice_list = []
+
+        # Next numeric suffix to try for each label, so that adding many IOs or subdevices with the same label
+        # doesn't rescan every suffix that is already taken
+        self._io_label_counters = {}
+        self._subdevice_label_counters = {}
+
+        # Bumped on every change to the device graph within self, so that a compiled schedule knows to recompile.
+        # The change is passed on to the Devices containing self, since their schedules include it.
+        self.graph_version = 0
+        self._owners = []
 
     def __repr__(self) -> str:
-        """Representation of the Device"""
-        ios = "{" + ", ".join(repr(io) for io in self.ios) + "}"
-        subdevices = "{" + ", ".join(repr(sub) for sub in self.subdevices) + "}"
-        return f"{type(self).__name__}('{self.label}', ios={ios}, subdevices={subdevices})"
+        """Representation of the Device, cached until the label, IOs or subdevices change"""
+        if self._repr_cache is None:
+            ios = "{" + ", ".join([repr(io) for io in self.ios]) + "}"
+            subdevices = "{" + ", ".join([repr(sub) for sub in self.subdevices]) + "}"
+            self._repr_cache = f"{self._type_name}('{self.label}', ios={ios}, subdevices={subdevices})"
+        return self._repr_cache
+
+    @property
+    def label(self) -> str:
+        """Used to identify the Device"""
+        return self._label
+
+    @label.setter
+    def label(self, label: str):
+        self._label = label
+        self._repr_cache = None
 
     def __le__(self, devices: 'Device' or tuple) -> 'Device':
         """Allows you to add subdevices: parent <= (child1, child2, ..., childn)"""
-        if isinstance(devices, collections.Iterable):
+        if type(devices) in (tuple, list):
+            for device in devices:
+                # Nested groupings like ((a, b), c) go through the general path
+                if isinstance(device, Device):
+                    self.add_subdevice(device)
+                else:
+                    self <= device
+            return self
+        elif isinstance(devices, Iterable):
             for device in devices:
                 self <= device
             return self
@@ -96,10 +137,28 @@ class Device(Connectable):
             label = io.label
 
         # Add the IO
-        self.ios[unique_key(label, self.ios)] = io
+        self._store_io(io, label)
+        self._repr_cache = None
+        self.graph_changed()
+        return self
 
+    def add_ios(self, ios: Iterable) -> 'Device':
+        """Add several new IO ports at once, each under its own label"""
+        for io in ios:
+            self._store_io(io, io.label)
+        self._repr_cache = None
+        self.graph_changed()
         return self
 
+    def _store_io(self, io: IO, label: str) -> None:
+        """Store io under a unique version of label, and in the list for its role"""
+        self.ios[sys.intern(unique_key(label, self.ios, self._io_label_counters))] = io
+        io._owners.append(self)
+        if isinstance(io, Output):
+            self._output_ios.append(io)
+        else:
+            self._input_ios.append(io)
+
     def io(self, label: str) -> IO:
         """Return the IO instance referred to by the label"""
         return self.ios[label]
@@ -109,12 +168,22 @@ class Device(Connectable):
         if label is None:
             label = subdevice.label
 
-        self.subdevices[unique_key(label, self.subdevices)] = subdevice
+        self.subdevices[sys.intern(unique_key(label, self.subdevices, self._subdevice_label_counters))] = subdevice
+        self._subdevice_list.append(subdevice)
+        subdevice._owners.append(self)
+        self._repr_cache = None
+        self.graph_changed()
         return self
 
+    def graph_changed(self) -> None:
+        """Invalidate the compiled schedules of self and every Device containing it"""
+        self.graph_version += 1
+        for owner in self._owners:
+            owner.graph_changed()
+
     def add_subdevices(self, subdevices: dict) -> 'Device':
-        for label in subdevices:
-            self.add_subdevice(subdevices[label], label)
+        for label, subdevice in subdevices.items():
+            self.add_subdevice(subdevice, label)
         return self
 
     def subdevice(self, label: str) -> 'Device':
@@ -128,23 +197,23 @@ class Device(Connectable):
 
     def tick(self) -> 'Device':
         # Load from inputs
-        for io in self.ios.values():
-            if io.bufstate == config.bufstate.filled:
+        for io in self._input_ios:
+            if io.bufstate is _FILLED:
                 io.tick()
 
         # Do own processing
         self.process()
 
         # Push from outputs
-        for io in self.ios.values():
-            if io.bufstate == config.bufstate.ready_to_push:
+        for io in self._output_ios:
+            if io.bufstate is _READY:
                 io.tick()
 
         return self
 
     def process(self) -> 'Device':
         # Run subdevices
-        for subdevice in self.subdevices:
-            self.subdevices[subdevice].tick()
+        for subdevice in self._subdevice_list:
+            subdevice.tick()
 
         return self
@@ -8,15 +8,55 @@ Classes:
     * LinearGain(SingleChannelEffect) - multiplies input by a gain factor (linear)
     * Gain(SingleChannelEffect) - multiplies input by a gain factor (dB scale)
     * Inverter(LinearGain) - a LinearGain where the gain factor is -1
+    * ClipDistortion(SingleChannelEffect) - clips the input
+    * FusedChain(Effect) - runs a chain of SingleChannelEffects as a single step
 """
+from collections.abc import Iterable
+
 import numpy as np
 
+from plappy.bufferpool import pool
 from plappy.devices import Device
 from plappy.io import Input, Output
 from plappy.mixins import SingleChannelDeviceMixin
 from plappy.plappyconfig import config
-from plappy.samplebuffer import SampleBuffer
-from plappy.util import linear, linear_gain
+from plappy.util import get_kernels, linear, linear_gain, linear_max
+
+# The clip ufunc itself, skipping the Python-level dispatch that np.clip goes through on every call
+try:
+    from numpy._core.umath import clip as _umath_clip
+except ImportError:
+    from numpy.core.umath import clip as _umath_clip
+
+# Read for every buffer, so bound once at import (like util.linear_max)
+_DTYPE = config.buffer_dtype
+_INTEGER_DTYPE = np.issubdtype(_DTYPE, np.integer)
+
+def _out_for(data: np.ndarray) -> np.ndarray:
+    """Return data if the result of a transform can be written straight back into it,
+    otherwise an array of the buffer dtype from the buffer pool"""
+    if data.dtype == _DTYPE and data.flags.writeable:
+        return data
+    return pool.acquire(data.shape, _DTYPE)
+
+
+def _scale(data: np.ndarray, factor: float) -> np.ndarray:
+    """Multiply data by factor, in place where possible. Unity gain passes data straight through
+    and zero gain just fills the output, without doing any arithmetic."""
+    out = _out_for(data)
+    if factor == 1:
+        if out is data:
+            return data
+        np.copyto(out, data, casting='unsafe')
+        return out
+    if factor == 0:
+        out.fill(0)
+        return out
+
+    kernels = get_kernels()
+    if kernels is not None:
+        return kernels.apply_gain(data, float(factor), out)
+    return np.multiply(data, factor, out=out, casting='unsafe')
 
 
 class Effect(Device):
@@ -25,21 +65,52 @@ class Effect(Device):
 
 
 class MultiChannelEffect(Effect):
-    """An Effect with any number of Inputs and Outputs"""
+    """An Effect with any number of Inputs and Outputs. All channels are processed at once: the inputs
+    are gathered into the rows of a 2-D array, which is transformed in a single call.
+
+        inputs (list[Input]): The Inputs, one per row of input_block
+        outputs (list[Output]): The Outputs, one per row of the transformed block
+        input_block (np.ndarray): (len(inputs), buffer_size) array the inputs are gathered into
+    """
     def __init__(self, label: str, num_inputs: int=0, num_outputs: int=0):
         """Initialize with a number of Inputs and a number of Outputs"""
         super().__init__(label)
-        self.inputs = []
-        for channel_number in range(num_inputs):
-            inp = Input(label=f"{self.label}-input-{channel_number}")
-            self.inputs.append(inp)
-            self.ios[inp.label] = inp
+        self.inputs = [Input(label=f"{self.label}-input-{channel_number}") for channel_number in range(num_inputs)]
+        self.outputs = [Output(label=f"{self.label}-output-{channel_number}") for channel_number in range(num_outputs)]
+        self.add_ios(self.inputs).add_ios(self.outputs)
+
+        self.input_block = np.zeros((num_inputs, config.buffer_size), dtype=config.buffer_dtype)
+
+    def process(self) -> 'MultiChannelEffect':
+        """Gather the inputs into input_block, transform all channels at once and load the rows of
+        the result into the outputs. Channels without data are silent."""
+        if self.input_block.shape[0] != len(self.inputs):
+            self.input_block = np.zeros((len(self.inputs), config.buffer_size), dtype=config.buffer_dtype)
 
-        self.outputs = []
-        for channel_number in range(num_outputs):
-            outp = Output(label=f"{self.label}-output-{channel_number}")
-            self.outputs.append(outp)
-            self.ios[outp.label] = outp
+        received = False
+        for row, inp in zip(self.input_block, self.inputs):
+            data = inp.read(writable=False)
+            if data is None:
+                row.fill(0)
+            else:
+                np.copyto(row, data, casting='unsafe')
+                pool.release(data)
+                received = True
+
+        if received:
+            block = self.transform(self.input_block)
+
+            # The rows are handed to the outputs, so they must not be overwritten on the next tick
+            if np.may_share_memory(block, self.input_block):
+                block = np.copy(block)
+
+            for row, outp in zip(block, self.outputs):
+                outp.load_array(row)
+        return self
+
+    def transform(self, block: np.ndarray) -> np.ndarray:
+        """Default transformation: do nothing. Takes and returns a (channels, buffer_size) array."""
+        return block
 
 
 class SingleChannelEffect(Effect, SingleChannelDeviceMixin):
@@ -49,21 +120,30 @@ class SingleChannelEffect(Effect, SingleChannelDeviceMixin):
         effect = MultiChannelEffect(self.label, 0, 0)
         effect.inputs.append(self.input)
         effect.outputs.append(self.output)
+        effect.add_io(self.input).add_io(self.output)
         return effect
 
     def process(self) -> 'SingleChannelEffect':
         """Read input, transform it and load the result into the output"""
+        # Input.tick() has already reset the bufstate by now, so check whether anything was received
+        if not self.input.has_data():
+            return self
+
         data = self.input.read()
-        if data is not None:
-            self.output.load(
-                buffer=SampleBuffer.from_array(
-                    array=self.transform(data)
-                )
-            )
+        result = self.transform(data)
+        self.output.load_array(result)
+
+        # A result which is (or views) data keeps it in use, so it can only be released otherwise
+        if not np.may_share_memory(result, data):
+            pool.release(data)
         return self
 
     def transform(self, data: np.ndarray):
-        """Default transformation: do nothing"""
+        """Default transformation: do nothing.
+
+        data is owned by the effect and may be modified or returned (or a view of it returned). The returned
+        array is handed to the output, and data is released to the buffer pool unless the two share memory,
+        so data must not be kept after returning."""
         return data
 
 
@@ -75,8 +155,8 @@ class LinearGain(SingleChannelEffect):
         self.gain = 1
 
     def transform(self, data: np.ndarray) -> np.ndarray:
-        """Multiply data by a constant gain factor (linear scale)"""
-        return (data * self.gain).astype(config.buffer_dtype)
+        """Multiply data by a constant gain factor (linear scale), in place where possible"""
+        return _scale(data, self.gain)
 
 
 class Inverter(LinearGain):
@@ -85,6 +165,13 @@ class Inverter(LinearGain):
         super().__init__(label)
         self.gain = -1
 
+    def transform(self, data: np.ndarray) -> np.ndarray:
+        """Negate data, in place where possible"""
+        kernels = get_kernels()
+        if kernels is not None:
+            return kernels.invert(data, _out_for(data))
+        return np.negative(data, out=_out_for(data), casting='unsafe')
+
 
 class Gain(SingleChannelEffect):
     """Multiplies the input by a gain factor (dB scale)"""
@@ -92,9 +179,20 @@ class Gain(SingleChannelEffect):
         super().__init__(label)
         self.db = db
 
+    @property
+    def db(self) -> float:
+        """Gain in dB"""
+        return self._db
+
+    @db.setter
+    def db(self, db: float):
+        """Set the gain in dB, and precompute the linear gain factor"""
+        self._db = db
+        self._linear_gain = linear_gain(db)
+
     def transform(self, data: np.ndarray) -> np.ndarray:
-        """Multiply data by a constant gain factor (dB scale)"""
-        return (data * linear_gain(self.db)).astype(config.buffer_dtype)
+        """Multiply data by a constant gain factor (dB scale), in place where possible"""
+        return _scale(data, self._linear_gain)
 
 
 class ClipDistortion(SingleChannelEffect):
@@ -103,6 +201,114 @@ class ClipDistortion(SingleChannelEffect):
         super().__init__(label)
         self.dbfs = dbfs
 
+    @property
+    def dbfs(self) -> float:
+        """Clipping threshold in dBFS"""
+        return self._dbfs
+
+    @dbfs.setter
+    def dbfs(self, dbfs: float):
+        """Set the threshold in dBFS, and precompute the linear threshold"""
+        self._dbfs = dbfs
+        self._absmax = abs(linear(dbfs))
+
     def transform(self, data: np.ndarray) -> np.ndarray:
-        absmax = abs(linear(self.dbfs))
-        return np.clip(data, -absmax, absmax)
+        """Clip data to the threshold, in place where possible"""
+        absmax = self._absmax
+
+        # Nothing in the buffer dtype can exceed full scale, so clipping at or above it does nothing
+        if absmax >= linear_max and data.dtype == _DTYPE:
+            return data
+
+        kernels = get_kernels()
+        if kernels is not None:
+            return kernels.clip(data, absmax, _out_for(data))
+
+        # For integer output, clipping at the truncated threshold is the same as truncating the clipped value
+        if _INTEGER_DTYPE:
+            absmax = int(absmax)
+        return _umath_clip(data, -absmax, absmax, out=_out_for(data), casting='unsafe')
+
+
+class FusedChain(Effect):
+    """Runs a chain of SingleChannelEffects as a single step: the transforms are applied back-to-back
+    to one array instead of passing it through the Outputs and Inputs between the effects.
+
+    A FusedChain borrows the Input of the first effect and the Output of the last effect. It is created
+    by DeviceCollectionMixin.compile() and is not itself part of the device graph.
+
+        effects (list[SingleChannelEffect]): The effects in the chain, in order
+    """
+    def __init__(self, effects: list):
+        """Initialize with a list of effects, each feeding only the next one"""
+        super().__init__('+'.join(effect.label for effect in effects))
+        self.effects = effects
+        self.input = effects[0].input
+        self.output = effects[-1].output
+
+        # Borrowed, so these are not registered through add_io
+        self._input_ios.append(self.input)
+        self._output_ios.append(self.output)
+
+    @staticmethod
+    def fusible(effect: Device) -> bool:
+        """Return whether the effect does all of its processing in transform()"""
+        return isinstance(effect, SingleChannelEffect) and type(effect).process is SingleChannelEffect.process
+
+    @classmethod
+    def _follow(cls, first: Device, by_input: dict, consumed: set) -> list:
+        """Return the run of fusible effects starting at first. A run continues from one effect to the next
+        when the Output of the first is connected to nothing but the Input of the next, and vice versa.
+        by_input maps id(effect.input) to the candidate effects, and the ids of chained effects are added to consumed."""
+        chain = [first]
+        while cls.fusible(chain[-1]) and len(chain[-1].output.connections) == 1:
+            connection, = chain[-1].output.connections
+            following = by_input.get(id(connection))
+            if following is None or len(connection.connections) != 1 or id(following) in consumed:
+                break
+            chain.append(following)
+            consumed.add(id(following))
+        return chain
+
+    @classmethod
+    def fuse(cls, first: SingleChannelEffect, devices: Iterable or None = None) -> Device:
+        """Return a FusedChain of first and the effects following it in a >> pipeline, or first itself
+        if there is nothing to fuse it with. The effects are looked up among devices, which defaults to
+        the subdevices of the collection that >> put first in."""
+        if devices is None:
+            superdevice = getattr(first, 'superdevice', None)
+            devices = superdevice.subdevices.values() if superdevice is not None else ()
+        by_input = {id(device.input): device for device in devices if cls.fusible(device)}
+
+        chain = cls._follow(first, by_input, {id(first)})
+        return cls(chain) if len(chain) > 1 else first
+
+    @classmethod
+    def fuse_runs(cls, devices: list) -> list:
+        """Return the devices with every run of fusible effects replaced by a FusedChain.
+        devices must be in dependency order."""
+        by_input = {id(device.input): device for device in devices if cls.fusible(device)}
+
+        fused = []
+        consumed = set()
+        for device in devices:
+            if id(device) in consumed:
+                continue
+
+            chain = cls._follow(device, by_input, consumed)
+            fused.append(cls(chain) if len(chain) > 1 else device)
+        return fused
+
+    def process(self) -> 'FusedChain':
+        """Read the input, run it through every transform and load the result into the output"""
+        if not self.input.has_data():
+            return self
+
+        data = self.input.read()
+        for effect in self.effects:
+            result = effect.transform(data)
+            if not np.may_share_memory(result, data):
+                pool.release(data)
+            data = result
+        self.output.load_array(data)
+        return self
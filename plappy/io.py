@@ -2,38 +2,100 @@
 io module - Low-level Input/Output objects which can be connected
 
 Classes:
+    * ConnectionGroup(object) - A group of IOs which are all connected to each other
     * IO(object) - Generic Input/Output object
     * Input(IO) - IO object which can only receive data
+    * RingInput(Input) - Input which queues received data in its own RingBuffer
     * Output(IO) - IO object which can only send data
 """
+import sys
+
 import numpy as np
 
 from plappy.core import Connectable
 from plappy.exceptions import ConnectionError, SelfConnectionError
 from plappy.plappyconfig import config
+from plappy.ringbuffer import RingBuffer
 from plappy.samplebuffer import SampleBuffer
 
+# Set on every load, clear and tick, so bound once at import
+_EMPTY = config.bufstate.empty
+_FILLED = config.bufstate.filled
+_READY = config.bufstate.ready_to_push
+
+
+class ConnectionGroup(object):
+    """A group of IOs which are all connected to each other. Every IO belongs to exactly one group,
+    and connecting two IOs merges their groups, so connections are transitive.
+
+        members (set): The IOs in the group
+        output (Output or None): The Output in the group, there can be at most one
+    """
+    __slots__ = ('members', 'output')
+
+    def __init__(self, io: 'IO'):
+        """Initialize a group containing only io"""
+        self.members = {io}
+        self.output = io if isinstance(io, Output) else None
+
+    def merge_check(self, other: 'ConnectionGroup') -> None:
+        """Raise a ConnectionError if the two groups can't be merged"""
+        if self.output is not None and other.output is not None:
+            raise ConnectionError(
+                f"Cannot connect two Outputs ('{self.output.label}' and '{other.output.label}'), use a SimpleMixer or Mixer")
+
+    def remove(self, io: 'IO') -> 'ConnectionGroup':
+        """Remove io from the group"""
+        self.members.remove(io)
+        if io is self.output:
+            self.output = None
+        return self
+
+    def graph_changed(self) -> None:
+        """Tell every member that its connections have changed"""
+        for io in self.members:
+            io.graph_changed()
+
+    def merge(self, other: 'ConnectionGroup') -> 'ConnectionGroup':
+        """Move the members of the smaller group into the larger one, and return the larger one"""
+        if len(other.members) > len(self.members):
+            return other.merge(self)
+
+        self.members |= other.members
+        if self.output is None:
+            self.output = other.output
+        for io in other.members:
+            io._group = self
+        return self
+
 
 class IO(Connectable):
     """A generic Input/Output object.
 
         label (str): Used to identify the IO object
-        connections (set): A set of other IO's that it is connected to
+        connections (set): The other IOs in the same ConnectionGroup
         buffer (SampleBuffer): Stores data
-        bufstate (int): A flag to indicate the state of the IO
+        bufstate (BufState): A flag to indicate the state of the IO
     """
+    # There can be hundreds of IOs in a patch, and all of them are ticked for every buffer
+    __slots__ = ('_group', 'buffer', 'bufstate', '_owners')
 
     def __init__(self, label: str):
-        """Initialize IO with a label, connections, and an empty buffer."""
-        super().__init__(label)
+        """Initialize IO with a label, its own ConnectionGroup, and an empty buffer."""
+        # Interned, since the label is mostly used as a dict key
+        super().__init__(sys.intern(label))
+        self._group = ConnectionGroup(self)
         self.buffer = SampleBuffer()
-        self.bufstate = config.bufstate.empty
+        self.bufstate = _EMPTY
+
+        # The Devices the IO has been added to
+        self._owners = []
 
     def __repr__(self) -> str:
         """Print a useful representation of the IO object"""
         parts = (
-            f"{type(self).__name__}('{self.label}', connections = {{",
-            ', '.join(f"'{conn.label}'" for conn in self.connections),
+            f"{self._type_name}('{self.label}', connections = {{",
+            ', '.join([f"'{conn.label}'" for conn in self.connections]),
             "}, buffer=",
             repr(self.buffer),
             ")"
@@ -47,19 +109,28 @@ class IO(Connectable):
             'connections': tuple(conn.label for conn in self.connections)
         }
 
+    @property
+    def connections(self) -> set:
+        """The other IOs that self is connected to"""
+        return self._group.members - {self}
+
     def connected(self, io: 'Connectable') -> bool:
         """Return whether self is connected to io"""
-        return super().connected(io) or io in self.connections
+        return super().connected(io) or (io is not self and getattr(io, '_group', None) is self._group)
 
     def disconnected(self) -> bool:
         """Return whether self is completely disconnected"""
-        return super().disconnected() or len(self.connections) == 0
+        return super().disconnected() or len(self._group.members) == 1
 
     def connect(self, conn: 'Connectable', **kwargs) -> 'Connectable':
         """Connect to another IO"""
-        if conn.has_connector():
+        if conn._has_connector:
             return self.connect(conn.connector(**kwargs))
 
+        # Anything that isn't an IO handles the connection itself in onconnect()
+        if not isinstance(conn, IO):
+            return super().connect(conn, **kwargs)
+
         # If they are already connected, don't do anything
         if self.connected(conn) or conn is self:
             return conn
@@ -68,29 +139,11 @@ class IO(Connectable):
         self.connect_check(conn)
         conn.connect_check(self)
 
-        # Check that all of the connections can be connected to each other
-        connection_union = conn.connections | self.connections
-        for connection in connection_union:
-            # Check each connection with every other connection
-            for connection_2 in connection_union:
-                if connection is not connection_2:
-                    connection.connect_check(connection_2)
-                    connection_2.connect_check(connection)
-
-            # Check each connection with self and conn
-            self.connect_check(connection)
-            conn.connect_check(connection)
-            connection.connect_check(self)
-            connection.connect_check(conn)
-
-        # OK. Copy the connection union, then add conn to self and self to conn.
-        self.connections, conn.connections = set(connection_union), set(connection_union)
-        self.connections.add(conn)
-        conn.connections.add(self)
-
-        # And add conn and self to every other connection
-        for connection in connection_union:
-            connection.connections.update((self, conn))
+        # Each group is already valid on its own, and a group is valid as long as it has at most one Output
+        self._group.merge_check(conn._group)
+
+        # OK. Merge the groups. Every member may have gained a connection.
+        self._group.merge(conn._group).graph_changed()
 
         # Return
         return super().connect(conn, **kwargs)
@@ -107,43 +160,73 @@ class IO(Connectable):
         if self.disconnected():
             return self
 
-        # Disconnect self from everything else
-        for connection in self.connections:
-            connection.connections.remove(self)
+        # Leave the group and start a new one
+        group = self._group.remove(self)
+        self._group = ConnectionGroup(self)
 
-        # Disconnect everything else from self
-        self.connections = set()
+        group.graph_changed()
+        self.graph_changed()
 
         # Return self to allow for further connection in the same statement
         return super().disconnect()
 
+    def graph_changed(self) -> None:
+        """Invalidate the compiled schedules of the Devices the IO belongs to"""
+        for owner in self._owners:
+            owner.graph_changed()
+
     def load(self, buffer: SampleBuffer or None) -> 'IO':
-        """Load the SampleBuffer into the IO"""
+        """Load the SampleBuffer into the IO. The array is shared, and only copied if it is modified."""
+        self.buffer.share(buffer)
+        self.bufstate = _FILLED
+        return self
+
+    def load_array(self, array: np.ndarray or memoryview) -> 'IO':
+        """Load a bare array into the IO without wrapping it in a SampleBuffer first.
+        The array is owned by Plappy afterwards.
+
+        Anything supporting the buffer protocol (such as a memoryview) is accepted as well, and is viewed
+        as an array without copying. Read-only memory is copied by the first consumer which modifies it."""
+        if array is not None and not isinstance(array, np.ndarray):
+            array = np.asarray(array)
         self.buffer.destroy()
-        self.buffer = SampleBuffer(other=buffer)
-        self.bufstate = config.bufstate.filled
+        self.buffer.array = array
+        self.bufstate = _FILLED
         return self
 
     def clear(self) -> 'IO':
         """Clear the IO's buffer"""
         self.buffer.destroy()
-        self.bufstate = config.bufstate.empty
+        self.bufstate = _EMPTY
         return self
 
     def push(self) -> 'IO':
         """Send content from the IO's buffer to its connections"""
-        for connection in self.connections:
-            connection.load(self.buffer)
+        for connection in self._group.members:
+            if connection is not self:
+                connection.load(self.buffer)
         return self
 
     def flush(self) -> 'IO':
         """Send content from the IO's buffer to its connections and clear it"""
         return self.push().clear()
 
-    def read(self) -> np.ndarray:
-        """Read content from the IO's buffer and clear it"""
+    def read(self, writable: bool = True) -> np.ndarray:
+        """Read content from the IO's buffer and clear it. The caller owns the returned array.
+
+        With writable=False, an array which is shared with other IOs or is read-only is returned as a
+        read-only view instead of being copied. The view must not be kept after the current tick."""
+        array = self.buffer.array
+        if not writable and array is not None and (self.buffer.nrefs > 1 or not array.flags.writeable):
+            view = self.buffer.as_readonly_view()
+            self.clear()
+            return view
+
         self.buffer.prepare_to_modify()
         contents = self.buffer.array
+
+        # Detach the array so that clearing doesn't release it to the buffer pool
+        self.buffer.array = None
         self.clear()
         return contents
 
@@ -153,6 +236,8 @@ class IO(Connectable):
 
 
 class MultiIO(Connectable):
+    __slots__ = ('ios',)
+
     def __init__(self, label: str, ios: set or None = None):
         super().__init__(label)
         self.ios = ios if ios is not None else set()
@@ -175,6 +260,7 @@ class MultiIO(Connectable):
 class Input(IO):
     """An Input object is an IO object with additional restrictions and has
     different bufstates after load() and tick()."""
+    __slots__ = ()
 
     def __gt__(self, other: 'IO') -> 'IO':
         """Create a useful warning when trying to connect stuff."""
@@ -183,19 +269,68 @@ class Input(IO):
     def load(self, buffer: SampleBuffer) -> IO:
         """Load buffer, then set bufstate to filled"""
         super().load(buffer)
-        self.bufstate = config.bufstate.filled
+        self.bufstate = _FILLED
         return self
 
     def tick(self) -> IO:
         """Called by devices, sets the bufstate to empty"""
-        self.bufstate = config.bufstate.empty
+        self.bufstate = _EMPTY
         return self
 
+    def has_data(self) -> bool:
+        """Return whether there is anything to read, regardless of the bufstate"""
+        return self.buffer.array is not None
+
+
+class RingInput(Input):
+    """An Input which copies everything it receives into its own pre-allocated RingBuffer instead of sharing
+    the sender's SampleBuffer. Received arrays are released as soon as the sender is done with them, the
+    reader decides how many samples to take at a time, and memory use is bounded by the ring capacity.
+
+        ring (RingBuffer): Holds received samples until they are read
+    """
+    __slots__ = ('ring',)
+
+    def __init__(self, label: str, capacity: int or None = None):
+        """Initialize with a ring of the given capacity (default: four buffers)"""
+        super().__init__(label)
+        self.ring = RingBuffer(4 * config.buffer_size if capacity is None else capacity)
+
+    def load(self, buffer: SampleBuffer) -> IO:
+        """Copy the contents of buffer into the ring, then set bufstate to filled"""
+        if buffer.array is not None:
+            self.ring.write(buffer.array)
+        self.bufstate = _FILLED
+        return self
+
+    def load_array(self, array: np.ndarray or memoryview) -> IO:
+        """Copy array (or anything supporting the buffer protocol) into the ring, then set bufstate to filled"""
+        self.ring.write(array)
+        self.bufstate = _FILLED
+        return self
+
+    def has_data(self) -> bool:
+        """Return whether the ring holds any unread samples"""
+        return self.ring.available() > 0
+
+    def clear(self) -> IO:
+        """Drop all unread samples"""
+        self.ring.read_pos = self.ring.write_pos
+        return super().clear()
+
+    def read(self, num: int or None = None, writable: bool = True) -> np.ndarray or None:
+        """Read the oldest num samples (default: one buffer) from the ring. The caller owns the returned array,
+        which is always a writable copy."""
+        if not self.ring.available():
+            return None
+        return self.ring.read(config.buffer_size if num is None else num)
+
 
 class Output(IO):
     """An Input object is an IO object with additional restrictions and has
     different bufstates after load() and tick(). When tick() is called, it
     flushes the contents of the buffer."""
+    __slots__ = ()
 
     def __lt__(self, other: 'IO') -> 'IO':
         """Create a useful warning when trying to connect stuff."""
@@ -204,7 +339,13 @@ class Output(IO):
     def load(self, buffer: SampleBuffer or None) -> 'Output':
         """Load buffer, then set bufstate to ready_to_push"""
         super().load(buffer)
-        self.bufstate = config.bufstate.ready_to_push
+        self.bufstate = _READY
+        return self
+
+    def load_array(self, array: np.ndarray or memoryview) -> 'Output':
+        """Load array, then set bufstate to ready_to_push"""
+        super().load_array(array)
+        self.bufstate = _READY
         return self
 
     def tick(self) -> 'Output':
@@ -15,12 +15,77 @@ Functions
 
     * stereo_class(mono_cls, *self_classes) - returns a class (not an instance!) for a stereo version of a Device
 """
+import heapq
+
+from plappy.bufferpool import pool
 from plappy.devices import Device
 from plappy.exceptions import ConnectionError
 from plappy.io import Input, Output
+from plappy.util import get_kernels
+
+
+def _ports(device: Device) -> list:
+    """Return the IOs of the device and all of its subdevices"""
+    ports = list(device.ios.values())
+    for subdevice in device.subdevices.values():
+        ports.extend(_ports(subdevice))
+    return ports
+
+
+def _dependency_order(devices: list) -> list:
+    """Return the devices sorted so that every device comes after the devices feeding its inputs.
+    Ties are broken by the original order, and feedback loops are broken at the earliest device."""
+    owners = {}
+    for index, device in enumerate(devices):
+        for io in _ports(device):
+            owners[id(io)] = index
+
+    downstream = [set() for _ in devices]
+    num_upstream = [0] * len(devices)
+    for index, device in enumerate(devices):
+        for io in _ports(device):
+            if not isinstance(io, Output):
+                continue
+            for connection in io.connections:
+                other = owners.get(id(connection))
+                if other is not None and other != index and other not in downstream[index]:
+                    downstream[index].add(other)
+                    num_upstream[other] += 1
+
+    ready = [index for index in range(len(devices)) if num_upstream[index] == 0]
+    heapq.heapify(ready)
+    remaining = set(range(len(devices)))
+    order = []
+    while remaining:
+        if not ready:
+            ready = [min(remaining)]
+        index = heapq.heappop(ready)
+        if index not in remaining:
+            continue
+        remaining.remove(index)
+        order.append(devices[index])
+        for other in downstream[index]:
+            num_upstream[other] -= 1
+            if num_upstream[other] == 0 and other in remaining:
+                heapq.heappush(ready, other)
+    return order
+
 
 class DeviceCollectionMixin(Device):
-    """A Device subclass used to group other devices without any further structure"""
+    """A Device subclass used to group other devices without any further structure.
+
+    The subdevices are compiled into a flat schedule of tick() calls in dependency order, so that
+    data flows through the whole collection in a single tick. The schedule is recompiled whenever
+    the device graph has changed since the last compile.
+    """
+    def __init__(self, label: str):
+        super().__init__(label)
+        self._schedule = []
+        self._schedule_version = None
+
+        # Collections are built before playback starts, so this is where the Numba kernels get compiled
+        get_kernels()
+
     def __or__(self, other: 'Device') -> 'DeviceCollectionMixin':
         """If the other type is a DeviceCollectionMixin, merge the subdevices. Otherwise, consume the other Device."""
         if isinstance(other, type(self)):
@@ -32,6 +97,40 @@ class DeviceCollectionMixin(Device):
         """Equivalent to __or__"""
         return self | other
 
+    def compile(self) -> 'DeviceCollectionMixin':
+        """Flatten the subdevices into a list of tick() calls in dependency order. Chains of effects
+        which only feed each other are fused into a single step, and bypassed devices only have their
+        input cleared.
+
+        Call this before playback to keep compiling out of the first tick. That includes the Numba kernels,
+        in case config.use_numba was set after the collection was created."""
+        from plappy.effects import FusedChain
+
+        get_kernels()
+
+        schedule = []
+        for subdevice in FusedChain.fuse_runs(_dependency_order(list(self.subdevices.values()))):
+            if isinstance(subdevice, DeviceCollectionMixin) and not subdevice.ios:
+                schedule.extend(subdevice.compile()._schedule)
+            elif isinstance(subdevice, MonoInputDeviceMixin) and subdevice.bypassed():
+                schedule.append(subdevice.input.clear)
+            else:
+                schedule.append(subdevice.tick)
+
+        self._schedule = schedule
+        self._schedule_version = self.graph_version
+        return self
+
+    def process(self) -> 'DeviceCollectionMixin':
+        """Run the compiled schedule, recompiling it first if the device graph has changed"""
+        if self._schedule_version != self.graph_version:
+            self.compile()
+
+        for step in self._schedule:
+            step()
+
+        return self
+
 class ContainerDevice(DeviceCollectionMixin):
     pass
 
@@ -55,12 +154,32 @@ class CollectableDeviceMixin(Device):
 
 
 class MonoInputDeviceMixin(CollectableDeviceMixin):
+    # Set by subclasses whose process_input() doesn't keep or modify data, so the input is neither copied
+    # nor allocated for them
+    borrows_input = False
+
     def __init__(self, label: str, bypass=False):
         super().__init__(label)
         self.input = Input(label=f"{self.label}-input")
-        self.ios[self.input.label] = self.input
+        self.add_io(self.input)
         self.bypass = bypass
 
+    @property
+    def bypass(self) -> bool:
+        """Whether the input is discarded instead of processed"""
+        return self._bypass
+
+    @bypass.setter
+    def bypass(self, bypass: bool):
+        """Set bypass, and recompile the schedules so that bypassed devices are skipped"""
+        self._bypass = bypass
+        self.graph_changed()
+
+    def bypassed(self) -> bool:
+        """Return whether the whole tick can be replaced by clearing the input. Subclasses which
+        override process() decide for themselves what bypass means."""
+        return self._bypass and type(self).process is MonoInputDeviceMixin.process
+
     def io(self, label: str = None) -> Input:
         """Return the single Output port available"""
         if label is not None and self.input.label != label:
@@ -73,9 +192,18 @@ class MonoInputDeviceMixin(CollectableDeviceMixin):
         if self.bypass:
             self.input.clear()
             return self
-        return self.process_input(self.input.read())
+        if not self.borrows_input:
+            return self.process_input(self.input.read())
+
+        data = self.input.read(writable=False)
+        self.process_input(data)
+        pool.release(data)
+        return self
 
     def process_input(self, data):
+        """Handle the data read from the input. data is owned by the device, unless borrows_input is set:
+        then it may be a read-only view of an array shared with other devices, and it is released to the
+        buffer pool afterwards, so it must not be modified or kept after returning."""
         return self
 
     def connector(self, **kwargs):
@@ -89,7 +217,7 @@ class MonoOutputDeviceMixin(CollectableDeviceMixin):
     def __init__(self, label: str):
         super().__init__(label)
         self.output = Output(label=f"{self.label}-output")
-        self.ios[self.output.label] = self.output
+        self.add_io(self.output)
 
     def io(self, label: str = None) -> Output:
         """Return the single Output port available"""
@@ -0,0 +1,175 @@
+"""
+numba_kernels module - Numba-compiled versions of the effect transforms
+
+Importing this module requires numba. The effects use these kernels instead of NumPy when config.use_numba is set.
+Every kernel writes its result into out (which may be data itself) and returns it. Results are truncated towards
+zero when out has an integer dtype, the same as NumPy's unsafe casting.
+
+Each kernel has a serial and a parallel version. Buffers of at least PARALLEL_THRESHOLD samples (offline rendering
+with large buffers) are split across threads, while small realtime buffers stay on the calling thread, where
+starting the thread pool would cost more than it saves.
+
+The kernels are compiled for the buffer dtype when this module is first imported (and cached on disk), so import
+it before starting playback to keep compilation out of the first tick.
+
+Functions:
+    * apply_gain(data, gain, out) - multiply data by a gain factor
+    * clip(data, threshold, out) - clip data to [-threshold, threshold]
+    * invert(data, out) - negate data
+    * fill_noise(out, states, level) - fill out with uniform noise from independent xoroshiro128+ generators
+    * ring_write(buffer, ptr, data) - copy data into a ring buffer at ptr, wrapping around at the end
+    * warm_up(dtype) - compile every kernel for arrays of the given dtype
+"""
+import numpy as np
+
+from numba import njit, prange
+
+from plappy.plappyconfig import config
+
+# Smallest number of samples for which the parallel kernels are used
+PARALLEL_THRESHOLD = 2048
+
+
+@njit(fastmath=True, cache=True)
+def _apply_gain_serial(data, gain, out):
+    for i in range(data.shape[0]):
+        out[i] = data[i] * gain
+    return out
+
+
+@njit(parallel=True, fastmath=True, cache=True)
+def _apply_gain_parallel(data, gain, out):
+    for i in prange(data.shape[0]):
+        out[i] = data[i] * gain
+    return out
+
+
+@njit(fastmath=True, cache=True)
+def _clip_serial(data, threshold, out):
+    for i in range(data.shape[0]):
+        out[i] = min(max(data[i], -threshold), threshold)
+    return out
+
+
+@njit(parallel=True, fastmath=True, cache=True)
+def _clip_parallel(data, threshold, out):
+    for i in prange(data.shape[0]):
+        out[i] = min(max(data[i], -threshold), threshold)
+    return out
+
+
+@njit(fastmath=True, cache=True)
+def _invert_serial(data, out):
+    for i in range(data.shape[0]):
+        out[i] = -data[i]
+    return out
+
+
+@njit(parallel=True, fastmath=True, cache=True)
+def _invert_parallel(data, out):
+    for i in prange(data.shape[0]):
+        out[i] = -data[i]
+    return out
+
+
+@njit(cache=True)
+def _fill_noise(out, state, span, level):
+    s0 = state[0]
+    s1 = state[1]
+    for i in range(out.shape[0]):
+        result = s0 + s1
+        s1 ^= s0
+        s0 = ((s0 << np.uint64(24)) | (s0 >> np.uint64(40))) ^ s1 ^ (s1 << np.uint64(16))
+        s1 = (s1 << np.uint64(37)) | (s1 >> np.uint64(27))
+
+        # The lowest bits of xoroshiro128+ are the weakest, so only the upper 53 are used
+        out[i] = np.int64((result >> np.uint64(11)) % span) - level
+    state[0] = s0
+    state[1] = s1
+    return out
+
+
+@njit(parallel=True, cache=True)
+def _fill_noise_parallel(out, states, span, level):
+    # Each generator fills its own contiguous part of out, so the threads never share a state
+    lanes = states.shape[0]
+    n = out.shape[0]
+    chunk = (n + lanes - 1) // lanes
+    for lane in prange(lanes):
+        start = lane * chunk
+        stop = min(start + chunk, n)
+        if start < stop:
+            _fill_noise(out[start:stop], states[lane], span, level)
+    return out
+
+
+@njit(cache=True, boundscheck=False)
+def ring_write(buffer, ptr, data):
+    """Copy data (no longer than buffer) into buffer starting at ptr, wrapping around at the end.
+    Returns the position after the last sample written."""
+    size = buffer.shape[0]
+    for i in range(data.shape[0]):
+        buffer[ptr] = data[i]
+        ptr += 1
+        if ptr == size:
+            ptr = 0
+    return ptr
+
+
+def apply_gain(data: np.ndarray, gain: float, out: np.ndarray) -> np.ndarray:
+    """Multiply data by a gain factor"""
+    if data.shape[0] >= PARALLEL_THRESHOLD:
+        return _apply_gain_parallel(data, gain, out)
+    return _apply_gain_serial(data, gain, out)
+
+
+def clip(data: np.ndarray, threshold: float, out: np.ndarray) -> np.ndarray:
+    """Clip data to [-threshold, threshold]"""
+    if data.shape[0] >= PARALLEL_THRESHOLD:
+        return _clip_parallel(data, threshold, out)
+    return _clip_serial(data, threshold, out)
+
+
+def invert(data: np.ndarray, out: np.ndarray) -> np.ndarray:
+    """Negate data"""
+    if data.shape[0] >= PARALLEL_THRESHOLD:
+        return _invert_parallel(data, out)
+    return _invert_serial(data, out)
+
+
+def fill_noise(out: np.ndarray, states: np.ndarray, level: int) -> np.ndarray:
+    """Fill out with noise uniformly distributed in [-level, level). states is a (lanes, 2) array holding the
+    two uint64 words of one xoroshiro128+ generator per row (not both zero), which are advanced in place.
+    Large buffers are split between all of the generators and filled in parallel, small buffers only use
+    the first one."""
+    span = int(2 * level)
+    if span <= 0:
+        out.fill(0)
+        return out
+    if out.shape[0] >= PARALLEL_THRESHOLD:
+        return _fill_noise_parallel(out, states, np.uint64(span), np.int64(level))
+    return _fill_noise(out, states[0], np.uint64(span), np.int64(level))
+
+
+def warm_up(dtype) -> None:
+    """Compile both versions of every kernel for arrays of the given dtype by running them on a one-sample array"""
+    data = np.zeros(1, dtype=dtype)
+    for apply_gain_kernel, clip_kernel, invert_kernel in (
+        (_apply_gain_serial, _clip_serial, _invert_serial),
+        (_apply_gain_parallel, _clip_parallel, _invert_parallel),
+    ):
+        apply_gain_kernel(data, 0.5, data)
+        clip_kernel(data, 0.5, data)
+        invert_kernel(data, data)
+    states = np.ones((1, 2), dtype=np.uint64)
+    _fill_noise(data, states[0], np.uint64(2), np.int64(1))
+    _fill_noise_parallel(data, states, np.uint64(2), np.int64(1))
+
+    # Players receive read-only views of shared buffers, which Numba compiles separately
+    view = data.view()
+    view.flags.writeable = False
+    ring_write(data, 0, data)
+    ring_write(data, 0, view)
+
+
+warm_up(config.buffer_dtype)
@@ -9,6 +9,8 @@ Functions
     * make_connections
     * parse_patch
 """
+from collections import deque
+
 import plappy
 from plappy.devices import Device, DevicePatch
 from plappy.exceptions import InvalidPatchError, IncompatibleVersionError
@@ -18,10 +20,11 @@ def validate_patch(patch: DevicePatch, props: tuple) -> None:
     for prop, datatype in props:
         if not prop in patch:
             raise InvalidPatchError(f"No '{prop}' in patch")
-        if type(prop) is not datatype:
+        if type(patch[prop]) is not datatype:
             raise InvalidPatchError(f"'{prop}' has incorrect type")
+    prop_names = dict(props)
     for prop in patch:
-        if not prop in props:
+        if not prop in prop_names:
             raise InvalidPatchError(f"Invalid property '{prop}' in patch")
 
 
@@ -36,39 +39,62 @@ def validate_version(patch: DevicePatch) -> tuple:
     return patch_version_parts
 
 
-def make_device(spec: dict, connections_to_make: set = None) -> (Device, set):
-    """Makes a Device from a DevicePatch"""
+def make_device(spec: dict, connections_to_make: set = None, io_by_label: dict = None) -> (Device, set):
+    """Makes a Device from a DevicePatch. The connections are returned as a set of sorted (io_label, conn_label) pairs,
+    and every IO that is created is added to io_by_label if it is given."""
     if connections_to_make is None:
         connections_to_make = set()
+    if io_by_label is None:
+        io_by_label = {}
+
+    # Breadth-first, so that subdevices are added to their superdevice in the order they appear in the patch
+    root = None
+    worklist = deque([(spec, None)])
+    while worklist:
+        spec, superdevice = worklist.popleft()
+        device = spec['class'](label=spec['label'])
+        if superdevice is None:
+            root = device
+        else:
+            superdevice <= device
+
+        for sub_spec in spec['subdevices']:
+            worklist.append((sub_spec, device))
 
-    cls = spec['class']
-    label = spec['label']
-    subdevices = spec['subdevices']
-    ios = spec['ios']
-    device = cls(label=label)
-    for sub_spec in subdevices:
-        subdevice, _ = make_device(sub_spec)
-        device <= subdevice
-    for io_spec in ios:
-        io_cls = io_spec['class']
-        io_label = io_spec['label']
-        io_connections = io_spec['connections']
-        io = io_cls(label=io_label)
-        for conn_label in io_connections:
-            connections_to_make.add(frozenset((io_label, conn_label)))
-        device.add_io(io, io_label)
-    return device, connections_to_make
-
-
-def make_connections(device: 'Device', connections: set):
+        for io_spec in spec['ios']:
+            io_label = io_spec['label']
+            io = io_spec['class'](label=io_label)
+            io_by_label[io_label] = io
+            for conn_label in io_spec['connections']:
+                # Both ends of a connection list each other, so store each pair in one order only
+                if io_label <= conn_label:
+                    connections_to_make.add((io_label, conn_label))
+                else:
+                    connections_to_make.add((conn_label, io_label))
+            device.add_io(io, io_label)
+    return root, connections_to_make
+
+
+def make_connections(device: 'Device', connections: set, io_by_label: dict = None):
     """Makes connections for a Device after it has been created"""
-    pass
+    if io_by_label is None:
+        io_by_label = {}
+        devices = deque([device])
+        while devices:
+            current = devices.popleft()
+            io_by_label.update((io.label, io) for io in current.ios.values())
+            devices.extend(current.subdevices.values())
+
+    # connect() does nothing for IOs that are already connected through other members of their group
+    for io_label, conn_label in connections:
+        io_by_label[io_label].connect(io_by_label[conn_label])
 
 
 def parse_patch(patch: DevicePatch) -> Device:
     """Performs the reading of a DevicePatch and returns a corresponding Device"""
     validate_patch(patch, props=(('version', str), ('schema', str), ('name', str), ('tree', dict)))
     patch_version_parts = validate_version(patch)
-    device, connections = make_device(patch)
-    make_connections(device, connections)
+    io_by_label = {}
+    device, connections = make_device(patch['tree'], io_by_label=io_by_label)
+    make_connections(device, connections, io_by_label)
     return device
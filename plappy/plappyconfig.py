@@ -1,22 +1,31 @@
 """
 plappyconfig module - Global configuration for Plappy.
 
+Classes:
+    BufState(Enum): the states an IO buffer can be in
+
 Variables:
     config (SimpleNamespace): a configuration namespace.
 """
+import enum
 import plappy
 import numpy as np
 
 from types import SimpleNamespace as sns
 
+
+class BufState(enum.Enum):
+    """The states an IO buffer can be in. Members are singletons, so they can be compared with 'is'."""
+    empty = 0
+    filled = 1
+    ready_to_push = 2
+
+
 config = sns(
     buffer_size = 256,
     buffer_dtype = np.int32,
     sample_rate = 44100,
+    use_numba = False,
     version=plappy.__version__,
-    bufstate = sns(
-        empty = 0,
-        filled = 1,
-        ready_to_push = 2,
-    ),
+    bufstate = BufState,
 )
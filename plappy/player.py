@@ -9,8 +9,11 @@ Classes:
 """
 import numpy as np
 
+from plappy.bufferpool import pool
 from plappy.devices import Device
 from plappy.mixins import MonoInputDeviceMixin, stereo_class
+from plappy.plappyconfig import config
+from plappy.util import get_kernels
 
 class Player(Device):
     def __init__(self, label, bypass = False):
@@ -23,37 +26,76 @@ class MonoPlayer(Player, MonoInputDeviceMixin):
 StereoPlayer = stereo_class(MonoPlayer, Player)
 
 class MonoBuffer(MonoPlayer):
+    """A MonoPlayer which keeps the most recent buffer_size samples it has received in a ring buffer"""
+    # The samples are copied into the ring buffer
+    borrows_input = True
+
     def __init__(self, label: str, buffer_size: int, bypass = False):
         super().__init__(label, bypass=bypass)
-        self.buffer = np.zeros(buffer_size)
+        self.buffer = np.zeros(buffer_size, dtype=config.buffer_dtype)
         self.buffer_size = buffer_size
         self.buffer_ptr = 0
+        self.num_samples = 0
 
     def process_input(self, data) -> 'MonoBuffer':
-        data_size = len(data)
-        available_data = self.buffer_size - self.buffer_ptr
+        """Append data to the buffer, overwriting the oldest samples when it is full"""
+        if data is None:
+            return self
+
+        size = self.buffer_size
+        num = data.shape[0]
+        if num > size:
+            # Only the last size samples survive, written where they would have ended up
+            self.buffer_ptr = (self.buffer_ptr + num - size) % size
+            data = data[num - size:]
+            num = size
 
-        if data_size > available_data:
-            data = data[:available_data]
-            data_size = available_data
+        kernels = get_kernels()
+        if kernels is not None:
+            self.buffer_ptr = kernels.ring_write(self.buffer, self.buffer_ptr, data)
+            self.num_samples = min(self.num_samples + num, size)
+            return self
 
-        self.buffer[self.buffer_ptr:self.buffer_ptr+data_size] = data
+        # The second copy is empty unless the write wraps around, the same split as RingBuffer.write
+        start = self.buffer_ptr
+        first = min(num, size - start)
+        np.copyto(self.buffer[start:start + first], data[:first], casting='unsafe')
+        np.copyto(self.buffer[:num - first], data[first:], casting='unsafe')
 
+        self.buffer_ptr = (start + num) % size
+        self.num_samples = min(self.num_samples + num, size)
         return self
 
     def full(self) -> bool:
-        return self.buffer_ptr == self.buffer_size - 1
+        """Return whether buffer_size samples have been received since the last read()"""
+        return self.num_samples == self.buffer_size
 
     def read(self) -> np.ndarray:
+        """Return the buffered data, oldest sample first, and start over with a zeroed buffer from the buffer pool.
+        The caller owns the returned array, and can hand it back with pool.release() when done."""
         buffer = self.buffer
-        self.buffer = np.zeros(self.buffer_size)
+        fresh = pool.acquire(self.buffer_size, config.buffer_dtype)
+
+        # Once the ring has wrapped around, the oldest sample is at buffer_ptr
+        ptr = self.buffer_ptr
+        if self.num_samples == self.buffer_size and ptr:
+            np.copyto(fresh[:self.buffer_size - ptr], buffer[ptr:])
+            np.copyto(fresh[self.buffer_size - ptr:], buffer[:ptr])
+            buffer, fresh = fresh, buffer
+
+        fresh.fill(0)
+        self.buffer = fresh
         self.buffer_ptr = 0
+        self.num_samples = 0
         return buffer
 
 StereoBuffer = stereo_class(MonoBuffer, StereoPlayer)
 
 class MonoPrinter(MonoPlayer):
     """A MonoPlayer which prints its input."""
+    # The samples are only printed
+    borrows_input = True
+
     def process_input(self, data) -> 'MonoPrinter':
         print(f"{self.label}: {data}")
         return self
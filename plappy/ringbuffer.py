@@ -0,0 +1,73 @@
+"""
+ringbuffer module - Fixed-size single-producer single-consumer ring buffer for samples
+
+Classes:
+    * RingBuffer(object) - Ring buffer backed by a pre-allocated np.ndarray, overwriting the oldest samples when full
+"""
+import numpy as np
+
+from plappy.bufferpool import pool
+from plappy.plappyconfig import config
+
+
+class RingBuffer(object):
+    """Single-producer single-consumer ring buffer backed by a pre-allocated np.ndarray. The capacity is rounded
+    up to a power of two, so positions wrap with a bit mask. When the writer gets more than a full capacity ahead
+    of the reader, the oldest samples are overwritten.
+
+        array (np.ndarray): The backing store
+        read_pos (int): Total number of samples consumed (or overwritten before being consumed)
+        write_pos (int): Total number of samples written
+    """
+
+    def __init__(self, capacity: int, dtype=None):
+        """Initialize with room for at least capacity samples"""
+        size = 1 << max(capacity - 1, 0).bit_length()
+        self.array = np.zeros(size, dtype=config.buffer_dtype if dtype is None else dtype)
+        self.mask = size - 1
+        self.read_pos = 0
+        self.write_pos = 0
+
+    def __repr__(self) -> str:
+        """Show the capacity and the number of unread samples"""
+        return f"{type(self).__name__}(capacity={len(self.array)}, available={self.available()})"
+
+    def available(self) -> int:
+        """Return the number of samples which can be read"""
+        return self.write_pos - self.read_pos
+
+    def write(self, data: np.ndarray) -> 'RingBuffer':
+        """Copy data into the ring, overwriting the oldest samples if there is not enough room"""
+        size = len(self.array)
+        num = len(data)
+        if num > size:
+            self.write_pos += num - size
+            data = data[num - size:]
+            num = size
+
+        start = self.write_pos & self.mask
+        first = min(num, size - start)
+        np.copyto(self.array[start:start + first], data[:first], casting='unsafe')
+        np.copyto(self.array[:num - first], data[first:], casting='unsafe')
+
+        self.write_pos += num
+        if self.write_pos - self.read_pos > size:
+            self.read_pos = self.write_pos - size
+        return self
+
+    def read(self, num: int, out: np.ndarray or None = None) -> np.ndarray:
+        """Copy the oldest num samples (or as many as are available) out of the ring, into out if given.
+        Otherwise the array comes from the buffer pool and is owned by the caller."""
+        num = min(num, self.available())
+        if out is None:
+            out = pool.acquire(num, self.array.dtype)
+        else:
+            out = out[:num]
+
+        start = self.read_pos & self.mask
+        first = min(num, len(self.array) - start)
+        np.copyto(out[:first], self.array[start:start + first])
+        np.copyto(out[first:], self.array[:num - first])
+
+        self.read_pos += num
+        return out
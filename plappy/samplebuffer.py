@@ -6,20 +6,54 @@ Classes:
 """
 import numpy as np
 
+from plappy.bufferpool import pool
+
+class _RefCell(object):
+    """The array shared by a group of SampleBuffers, and the number of SampleBuffers sharing it"""
+    __slots__ = ('array', 'n')
+
+    def __init__(self, array: np.ndarray or None = None):
+        self.array = array
+        self.n = 1
+
+
 class SampleBuffer(object):
     """Wrapper around np.array with manual reference counting used to enable
     efficient transfer of data from IO to IO (data is only copied before
     modification)
 
         array (np.ndarray): The actual data
-        refs (set): The set of all SampleBuffers which refer to self.array
+        nrefs (int): The number of SampleBuffers which refer to self.array
     """
+    # Every IO holds one, and one is created for each buffer that goes through SampleBuffer.from_array
+    __slots__ = ('_cell',)
 
     def __init__(self, other: 'SampleBuffer' or None = None):
-        """Initialize with data array and reference set"""
-        self.array = None if other is None else other.array
-        self.refs = set() if other is None else other.refs
-        self.refs.add(self)
+        """Initialize with data array and reference count"""
+        if other is None:
+            self._cell = _RefCell()
+        else:
+            self._cell = other._cell
+            self._cell.n += 1
+
+    @property
+    def array(self) -> np.ndarray or None:
+        """The actual data"""
+        return self._cell.array
+
+    @array.setter
+    def array(self, array: np.ndarray or None):
+        """Replace the array of this SampleBuffer only. Other SampleBuffers keep referring to the old array."""
+        if self._cell.n > 1:
+            self._cell.n -= 1
+            self._cell = _RefCell(array)
+        else:
+            self._cell.array = array
+
+    @property
+    def nrefs(self) -> int:
+        """The number of SampleBuffers which refer to self.array"""
+        return self._cell.n
 
     def __repr__(self) -> str:
         """Return an abbreviated view into the array"""
@@ -29,18 +63,14 @@ class SampleBuffer(object):
         else:
             array_repr = "None"
 
-        return f"SampleBuffer(id={id(self)}, nrefs={len(self.refs)}, array={array_repr})"
+        return f"SampleBuffer(id={id(self)}, nrefs={self._cell.n}, array={array_repr})"
 
     def __str__(self) -> str:
         """Same as __repr__"""
         return repr(self)
 
-    def __hash__(self) -> int:
-        """Used to make a set of refs"""
-        return hash(f"SampleBufferId{id(self)}")
-
-    def __eq__(self, other: 'SampleBuffer') -> bool:
-        """SampleBuffers are equal in value if they have the same array"""
+    def equals_value(self, other: 'SampleBuffer') -> bool:
+        """Return whether two SampleBuffers hold equal data (== compares identity)"""
         return np.array_equal(self.array, other.array)
 
     def same_ref(self, other: 'SampleBuffer') -> bool:
@@ -49,26 +79,60 @@ class SampleBuffer(object):
 
     @classmethod
     def from_array(cls, array: np.ndarray) -> 'SampleBuffer':
-        """Return a SampleBuffer with the data from the numpy array"""
+        """Return a SampleBuffer with the data from the numpy array. The array is owned by Plappy
+        afterwards, and may be reused once no SampleBuffer refers to it."""
         sample_buf = cls()
         sample_buf.array = array
         return sample_buf
 
+    def share(self, other: 'SampleBuffer' or None) -> 'SampleBuffer':
+        """Drop the current array and refer to the array of other instead, without copying it.
+        Equivalent to destroying self and replacing it with SampleBuffer(other=other)."""
+        if other is None:
+            self.destroy()
+            return self
+        if other._cell is self._cell:
+            return self
+
+        # Give up the current array, releasing it to the buffer pool if this was the last reference
+        cell = self._cell
+        cell.n -= 1
+        if cell.n == 0:
+            pool.release(cell.array)
+
+        self._cell = other._cell
+        self._cell.n += 1
+        return self
+
+    def as_readonly_view(self) -> np.ndarray or None:
+        """Return a read-only view of the array, which can be handed out without copying even if it is shared"""
+        if self.array is None:
+            return None
+        view = self.array.view()
+        view.flags.writeable = False
+        return view
+
     def destroy(self):
-        """Make self equivalent to a new SampleBuffer()"""
-        self.array = None
-        if self in self.refs:
-            self.refs.remove(self)
-        self.refs = { self, }
+        """Make self equivalent to a new SampleBuffer(). If self was the last reference to the array,
+        the array is released to the buffer pool."""
+        cell = self._cell
+        if cell.n == 1:
+            pool.release(cell.array)
+            cell.array = None
+        else:
+            cell.n -= 1
+            self._cell = _RefCell()
 
     def prepare_to_modify(self) -> 'SampleBuffer':
-        """Clone own array and remove references to self from other SampleBuffers"""
-        if len(self.refs) > 1:
-            temp = np.copy(self.array)
-            self.destroy()
+        """Clone own array and remove references to self from other SampleBuffers.
+        Read-only arrays (such as the constant buffers of some Sources) are always cloned."""
+        array = self._cell.array
+        if array is not None and (self._cell.n > 1 or not array.flags.writeable):
+            temp = pool.acquire(array.shape, array.dtype)
+            np.copyto(temp, array)
             self.array = temp
         return self
 
     def empty(self) -> bool:
         """Return whether the array is equivalent to a new SampleBuffer()"""
-        return self.array is None and len(self.refs) == 1
+        return self._cell.array is None and self._cell.n == 1
@@ -11,11 +11,27 @@ Classes:
 
 import numpy as np
 
+from plappy.bufferpool import pool
 from plappy.devices import Device
 from plappy.io import IO
 from plappy.mixins import MonoOutputDeviceMixin, stereo_class
 from plappy.plappyconfig import config
 from plappy.samplebuffer import SampleBuffer
+from plappy.util import get_kernels
+
+# The dtype of every generated buffer
+_DTYPE = config.buffer_dtype
+
+# Number of independent noise generators per NoiseSource
+_NOISE_LANES = 16
+
+
+def _constant(value, size: int) -> np.ndarray:
+    """Return a read-only buffer of size samples filled with value. It can be handed out on every tick,
+    since consumers which modify their input copy it first."""
+    array = np.full(size, value, dtype=_DTYPE)
+    array.flags.writeable = False
+    return array
 
 
 class Source(Device):
@@ -23,28 +39,57 @@ class Source(Device):
 
 
 class MonoSource(Source, MonoOutputDeviceMixin):
+    """A Source with a single Output. Subclasses implement generate_array(), which returns a bare array that is
+    loaded straight into the Output. Subclasses which override generate() instead still work, at the cost of
+    wrapping every buffer in a SampleBuffer and copying it before it is modified."""
+    # Whether generate() is the default wrapper around generate_array(), looked up once per class
+    _generates_arrays = True
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._generates_arrays = cls.generate is MonoSource.generate
+
+    def __init__(self, label: str):
+        super().__init__(label)
+
+        # Bound once, since process() calls both on every tick
+        self._generate_array = self.generate_array
+        self._load_array = self.output.load_array
+        self._bufsize = config.buffer_size
+
     def connect(self, other: IO, **kwargs) -> 'MonoSource':
         self.output.connect(other, **kwargs)
         return self
 
     def process(self) -> 'MonoSource':
+        if self._generates_arrays:
+            self._load_array(self._generate_array())
+            return self
+
+        # The subclass may keep the buffer it returned, so it is shared and copied by consumers which modify it
         self.output.load(self.generate())
         return self
 
-    def generate(self):
+    def generate(self) -> SampleBuffer or None:
+        """Return the next buffer wrapped in a SampleBuffer"""
+        array = self.generate_array()
+        return None if array is None else SampleBuffer.from_array(array)
+
+    def generate_array(self) -> np.ndarray or None:
+        """Return the next buffer. The array is owned by Plappy afterwards."""
         return None
 StereoSource = stereo_class(MonoSource, Source)
 
 
 class SilenceSource(MonoSource):
     """A MonoSource which produces only silence"""
-    def generate(self) -> SampleBuffer:
+    def __init__(self, label: str):
+        super().__init__(label)
+        self._zeros = _constant(0, self._bufsize)
+
+    def generate_array(self) -> np.ndarray:
         """Return a zeroed buffer"""
-        return SampleBuffer.from_array(
-            np.zeros(
-                shape=config.buffer_size
-            )
-        )
+        return self._zeros
 StereoSilenceSource = stereo_class(SilenceSource, StereoSource)
 
 
@@ -54,26 +99,48 @@ class DCSource(MonoSource):
         super().__init__(label)
         self.level = level
 
-    def generate(self):
+    @property
+    def level(self) -> int:
+        """The DC value"""
+        return self._level
+
+    @level.setter
+    def level(self, level: int):
+        """Set the DC value, and build the buffer which is handed out on every tick"""
+        self._level = level
+        self._dc = _constant(level, self._bufsize)
+
+    def generate_array(self) -> np.ndarray:
         """Return a DC buffer"""
-        return SampleBuffer.from_array(
-            np.full(
-                shape=config.buffer_size,
-                fill_value=self.level
-            )
-        )
+        return self._dc
 StereoDCSource = stereo_class(DCSource, StereoSource)
 
 
 class NoiseSource(DCSource):
-    """A MonoSource which produces noise"""
-    def generate(self):
-        """Return a buffer with noise"""
-        return SampleBuffer.from_array(
-            np.random.randint(
-                low=-self.level,
-                high=self.level,
-                size=config.buffer_size
-            )
-        )
+    """A MonoSource which produces noise, uniformly distributed in [-level, level)"""
+    def __init__(self, label: str, level: int, seed: int = None):
+        super().__init__(label, level)
+        self._rng = np.random.default_rng(seed)
+        self._uniform = np.empty(self._bufsize)
+
+        # States for the compiled xoroshiro128+ generators used when config.use_numba is set (must not be all zero).
+        # Large buffers are split between the generators and filled in parallel.
+        self._states = self._rng.integers(1, 2 ** 63, size=(_NOISE_LANES, 2), dtype=np.uint64)
+
+    def generate_array(self) -> np.ndarray:
+        """Return a buffer with noise. The random numbers are drawn into a scratch array and scaled
+        into a pooled buffer, so nothing is allocated in the steady state."""
+        kernels = get_kernels()
+        if kernels is not None:
+            array = pool.acquire(self._bufsize, _DTYPE)
+            return kernels.fill_noise(array, self._states, self.level)
+
+        uniform = self._uniform
+        self._rng.random(out=uniform)
+        np.multiply(uniform, 2 * self.level, out=uniform)
+        np.floor(uniform, out=uniform)
+
+        array = pool.acquire(self._bufsize, _DTYPE)
+        np.subtract(uniform, self.level, out=array, casting='unsafe')
+        return array
 StereoNoiseSource = stereo_class(NoiseSource, StereoSource)
@@ -2,36 +2,58 @@
 util module - Utilities for Plappy
 
 Functions:
-    * unique_key(key, collection): Creates a new key based on the old key which is guaranteed to be unique in the collection
+    * unique_key(key, collection, counters): Creates a new key based on the old key which is guaranteed to be unique in the collection
     * dB(linear_gain): Convert from linear gain factor to dB
     * dBFS(linear): Convert from linear value to dBFS value
     * linear_gain(dB): Convert from dB to linear gain factor
     * linear(dBFS): Convert from dBFS to linear value
+    * get_kernels(): Return the numba_kernels module if config.use_numba is set, otherwise None
 Variables:
     * linear_max: Maximum linear value
 """
+import math
+
 import numpy as np
 
 from plappy.plappyconfig import config
 
 linear_max = np.iinfo(config.buffer_dtype).max
 
-def unique_key(old_key: str, collection: dict) -> str:
-    """Create a old_key which is guaranteed to be unique in the collection"""
-    counter = 2
-    new_key = old_key
+# Imported on first use, so that the kernels are only compiled by those who set config.use_numba
+_numba_kernels = None
+
+def unique_key(old_key: str, collection: dict, counters: dict or None = None) -> str:
+    """Create a old_key which is guaranteed to be unique in the collection.
+
+    If counters is given, it must belong to the collection, and keys must never be removed from the collection.
+    The next suffix to try for each key is stored in it, so that repeated calls with the same key don't rescan
+    every suffix that is already taken."""
+    if old_key not in collection:
+        return old_key
+
+    counter = 2 if counters is None else counters.get(old_key, 2)
+    new_key = f"{old_key}{counter}"
     while new_key in collection:
-        new_key = f"{old_key}{counter}"
         counter += 1
+        new_key = f"{old_key}{counter}"
+
+    if counters is not None:
+        counters[old_key] = counter + 1
     return new_key
 
 
-def dB(linear_gain: float) -> float:
-    """Convert from linear gain factor to dB"""
-    return 20 * np.log10(linear_gain)
+def dB(linear_gain: float or np.ndarray) -> float or np.ndarray:
+    """Convert from linear gain factor to dB. Scalars go through math, which is much faster than NumPy for them."""
+    if np.ndim(linear_gain) != 0:
+        return 20 * np.log10(linear_gain)
+    if linear_gain == 0:
+        return -math.inf
+    if linear_gain < 0:
+        return math.nan
+    return 20 * math.log10(linear_gain)
 
 
-def dBFS(linear: float) -> float:
+def dBFS(linear: float or np.ndarray) -> float or np.ndarray:
     """Convert from linear value to dBFS value"""
     return dB(abs(linear) / linear_max)
 
@@ -45,3 +67,13 @@ def linear(dbfs: float) -> float:
     """Convert from dBFS to linear value"""
     return linear_max * linear_gain(dbfs)
 
+
+def get_kernels():
+    """Return the numba_kernels module if config.use_numba is set, otherwise None"""
+    global _numba_kernels
+    if not config.use_numba:
+        return None
+    if _numba_kernels is None:
+        from plappy import numba_kernels as kernels
+        _numba_kernels = kernels
+    return _numba_kernels